@@ -1,4 +1,6 @@
 import os
+import time
+import json
 import hashlib
 from tqdm import tqdm
 
@@ -14,15 +16,23 @@ from langchain_community.vectorstores import Chroma
 DATA_PATH = "scraped_data"
 DB_PATH = "db"
 EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
+REPORT_PATH = "build_report.json"
+
+# Record how long each step takes; saved as a JSON report at the end.
+stage_timings = {}
+build_start = time.perf_counter()
 
 # --- STEP 1: LOAD DOCUMENTS ---
 print("Loading documents...")
+stage_start = time.perf_counter()
 loader = DirectoryLoader(DATA_PATH, glob="*.txt")
 documents = loader.load()
+stage_timings["load"] = time.perf_counter() - stage_start
 print(f"Loaded {len(documents)} total documents from disk.")
 
 # --- NEW STEP 1.5: ADVANCED NEAR-DUPLICATE REMOVAL WITH LSH ---
 print("Scanning for and removing near-duplicate content using LSH...")
+stage_start = time.perf_counter()
 
 # Concept Applied: Locality-Sensitive Hashing (LSH) for Near-Duplicate Detection.
 # We create an LSH index. This is our "smart filing system."
@@ -51,28 +61,49 @@ for idx, doc in enumerate(tqdm(documents, desc="Processing documents for duplica
         unique_documents.append(doc)
         lsh.insert(f"doc_{idx}", minhash)
 
+stage_timings["deduplicate"] = time.perf_counter() - stage_start
 print(f"Removed {len(documents) - len(unique_documents)} near-duplicate documents.")
 print(f"Proceeding with {len(unique_documents)} unique documents.")
 
 
 # --- STEP 2: SPLIT THE (NOW DE-DUPLICATED) DOCUMENTS INTO CHUNKS ---
 print("Splitting unique documents into chunks...")
+stage_start = time.perf_counter()
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=1500,
     chunk_overlap=300
 )
 texts = text_splitter.split_documents(unique_documents)
+stage_timings["split"] = time.perf_counter() - stage_start
 print(f"Created {len(texts)} text chunks.")
 
 
 # --- STEP 3: CREATE EMBEDDINGS AND STORE ---
 print("Generating embeddings and creating the vector database...")
+stage_start = time.perf_counter()
 embeddings = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL)
 vectordb = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
+stage_timings["load_embedding_model"] = time.perf_counter() - stage_start
+stage_start = time.perf_counter()
 
 batch_size = 100
 for i in tqdm(range(0, len(texts), batch_size), desc="Adding documents to DB"):
     batch = texts[i:i+batch_size]
     vectordb.add_documents(documents=batch)
+stage_timings["embed_and_index"] = time.perf_counter() - stage_start
+
+
+# --- STEP 4: SAVE THE BUILD REPORT ---
+report = {
+    "stages_seconds": stage_timings,
+    "total_seconds": time.perf_counter() - build_start,
+    "documents": len(documents),
+    "unique_documents": len(unique_documents),
+    "chunks": len(texts),
+    "chunks_per_second": len(texts) / stage_timings["embed_and_index"] if stage_timings["embed_and_index"] else None,
+}
+with open(REPORT_PATH, "w", encoding="utf-8") as f:
+    json.dump(report, f, indent=2)
+print(f"Stage timings saved to {REPORT_PATH}")
 
 print("\n✅ Advanced deduplication complete. Clean database built successfully!")
\ No newline at end of file
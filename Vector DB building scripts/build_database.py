@@ -3,6 +3,9 @@
 from tqdm import tqdm #for progress bar
 # `os` is a standard Python library for interacting with the operating system, like creating folders.
 import os
+# `time` and `json` are used to measure how long each step takes and save the timings to a report.
+import time
+import json
 # `DirectoryLoader` is a specific tool from the LangChain library designed to load all documents from a folder.
 from langchain_community.document_loaders import DirectoryLoader
 # `RecursiveCharacterTextSplitter` is LangChain's recommended tool for splitting long texts into smaller chunks.
@@ -17,20 +20,28 @@ from langchain_community.vectorstores import Chroma
 DATA_PATH = "scraped_data"
 DB_PATH = "db"
 EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5" # Using a more powerful model
+REPORT_PATH = "build_report.json" # Where the stage timings of this build are saved.
+
+# Purpose: Record how long each step of the build takes, so slow steps are easy to spot.
+stage_timings = {}
+build_start = time.perf_counter()
 
 # --- STEP 1: LOAD DOCUMENTS ---
 # Purpose: To load all the raw text data from our .txt files into memory.
 print("Loading documents...")
+stage_start = time.perf_counter()
 # Concept Applied: Document Loading.
 # We initialize the DirectoryLoader, telling it where our data is (`DATA_PATH`) and what files to look for (`"*.txt"`).
 loader = DirectoryLoader(DATA_PATH, glob="*.txt")
 # The `.load()` method reads all the files and creates a list of Document objects. Each object contains the text and metadata (like the source filename).
 documents = loader.load()
+stage_timings["load"] = time.perf_counter() - stage_start
 print(f"Loaded {len(documents)} documents.")
 
 # --- STEP 2: SPLIT DOCUMENTS INTO CHUNKS ---
 # Purpose: To break down the loaded documents into smaller, searchable pieces for the reasons we discussed (Context Windows and Search Accuracy).
 print("Splitting documents into chunks...")
+stage_start = time.perf_counter()
 # Concept Applied: Text Splitting / Chunking.
 # We initialize the splitter. It's "Recursive" because it tries to split text along logical separators (like newlines `\n\n`, then `\n`, then spaces) to keep related text together.
 text_splitter = RecursiveCharacterTextSplitter(
@@ -39,14 +50,18 @@ text_splitter = RecursiveCharacterTextSplitter(
 )
 # The `.split_documents()` method takes our list of long documents and returns a new list of smaller, chunked documents.
 texts = text_splitter.split_documents(documents)
+stage_timings["split"] = time.perf_counter() - stage_start
 print(f"Created {len(texts)} text chunks.")
 
 # --- STEP 3: CREATE EMBEDDINGS AND STORE IN DATABASE ---
 # Purpose: To convert our text chunks into numerical vectors and save them in a searchable database.
 print("Generating embeddings and creating the vector database... (This may take a while with the new model)")
+stage_start = time.perf_counter()
 # Concept Applied: Vectorization and Indexing.
 # We initialize our embedding model. We've switched to `bge-base-en-v1.5`, which is a more powerful model known for better retrieval performance.
 embeddings = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL)
+stage_timings["load_embedding_model"] = time.perf_counter() - stage_start
+stage_start = time.perf_counter()
 
 # This single command does all the heavy lifting:
 # 1. It takes our `texts` (the chunks).
@@ -58,6 +73,8 @@ vectordb = Chroma.from_documents(
     embedding=embeddings,
     persist_directory=DB_PATH
 )
+stage_timings["embed_and_index"] = time.perf_counter() - stage_start
+stage_start = time.perf_counter()
 
 # Define the batch size
 batch_size = 100
@@ -67,5 +84,19 @@ for i in tqdm(range(0, len(texts), batch_size), desc="Adding documents to DB"):
     batch = texts[i:i+batch_size]
     # Add the batch to the vector database
     vectordb.add_documents(documents=batch)
+stage_timings["add_batches"] = time.perf_counter() - stage_start
+
+# --- STEP 4: SAVE THE BUILD REPORT ---
+# Purpose: Save the timings as JSON so builds can be compared with each other.
+report = {
+    "stages_seconds": stage_timings,
+    "total_seconds": time.perf_counter() - build_start,
+    "documents": len(documents),
+    "chunks": len(texts),
+    "chunks_per_second": len(texts) / stage_timings["embed_and_index"] if stage_timings["embed_and_index"] else None,
+}
+with open(REPORT_PATH, "w", encoding="utf-8") as f:
+    json.dump(report, f, indent=2)
+print(f"Stage timings saved to {REPORT_PATH}")
 
 print("\n✅ Database built successfully!")
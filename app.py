@@ -1,17 +1,21 @@
+import uuid
+from operator import itemgetter
 import streamlit as st
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain.prompts import ChatPromptTemplate
 # UPDATED IMPORTS to use the latest packages and avoid deprecation warnings
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.llms import Ollama
+from memory import ConversationStore
 
 # --- CONFIGURATION ---
 # Purpose: Define constants for the application.
 DB_PATH = "db"
 MODEL_NAME = "mistral"
 EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
+# Only the latest messages are kept on screen. The model's memory is bounded separately (see `memory.py`).
+MAX_DISPLAYED_MESSAGES = 50
 
 # --- RAG CHAIN SETUP ---
 # Concept: Caching. Streamlit reruns the script on each interaction.
@@ -41,6 +45,10 @@ def load_rag_chain():
     Do not make up information. If the context does not contain the answer, say so clearly.
 
     Based on the following context, please provide a detailed answer to the question.
+    Use the conversation so far only to understand what the question refers to.
+
+    Conversation so far:
+    {history}
 
     Context:
     {context}
@@ -50,9 +58,15 @@ def load_rag_chain():
     """
     prompt = ChatPromptTemplate.from_template(template)
     
-    # Create and return the RAG chain
+    # Create and return the RAG chain.
+    # The input is a dict: the retriever searches with the history-aware `retrieval_query`,
+    # while the LLM sees the user's original `question` and the conversation `history`.
     chain = (
-        {"context": retriever, "question": RunnablePassthrough()}
+        {
+            "context": itemgetter("retrieval_query") | retriever,
+            "question": itemgetter("question"),
+            "history": itemgetter("history"),
+        }
         | prompt
         | llm
         | StrOutputParser()
@@ -60,6 +74,12 @@ def load_rag_chain():
     print("RAG chain loaded successfully.")
     return chain
 
+# Concept: `@st.cache_resource` also works for shared objects. There is one conversation store
+# for the whole server, so idle sessions are evicted and total memory stays under a global cap.
+@st.cache_resource
+def load_conversation_store():
+    return ConversationStore()
+
 # --- STREAMLIT UI SETUP ---
 st.set_page_config(page_title="TCET Chatbot", page_icon="🤖")
 st.title("🤖 TCET College Assistant")
@@ -73,6 +93,10 @@ if "messages" not in st.session_state:
         {"role": "assistant", "content": "Welcome! How can I help you with your questions about TCET today?"}
     ]
 
+# Kept in its own check: sessions that were open before this key existed already have `messages`.
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 # Display the chat history
 for message in st.session_state.messages:
     # `st.chat_message` creates a chat bubble in the UI.
@@ -81,6 +105,8 @@ for message in st.session_state.messages:
 
 # Load the RAG chain (this will be cached after the first run)
 rag_chain = load_rag_chain()
+# The conversation memory for this browser session. A fresh one is started if it was evicted while idle.
+conversation = load_conversation_store().get(st.session_state.session_id)
 
 # --- CHAT INTERACTION LOGIC ---
 # `st.chat_input` creates the text box at the bottom of the screen.
@@ -98,7 +124,14 @@ if prompt := st.chat_input("Ask me anything about TCET..."):
         with st.spinner("Thinking..."):
             # `st.write_stream` is used to display the output of the RAG chain
             # chunk by chunk as it's generated by the LLM, creating a "typing" effect.
-            response = st.write_stream(rag_chain.stream(prompt))
+            response = st.write_stream(rag_chain.stream({
+                "question": prompt,
+                "retrieval_query": conversation.retrieval_query(prompt),
+                "history": conversation.history_text(),
+            }))
 
-    # Add the assistant's final response to the chat history.
-    st.session_state.messages.append({"role": "assistant", "content": response})
\ No newline at end of file
+    # Add the assistant's final response to the chat history and the model's memory.
+    st.session_state.messages.append({"role": "assistant", "content": response})
+    conversation.add_turn(prompt, response)
+    # Drop the oldest messages so the on-screen history doesn't grow forever.
+    del st.session_state.messages[:-MAX_DISPLAYED_MESSAGES]
\ No newline at end of file
@@ -1,14 +1,19 @@
 import os
+import time
+import uuid
+import asyncio
+from functools import lru_cache
 import uvicorn
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
+from fastapi.responses import FileResponse, PlainTextResponse
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain.prompts import ChatPromptTemplate
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.llms import Ollama
+import metrics
+from memory import ConversationStore
 
 # --- CONFIGURATION ---
 DB_PATH = "db"
@@ -16,6 +21,9 @@ DB_PATH = "db"
 MODEL_NAME = "phi3:mini" 
 EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
 STATIC_DIR = "static"
+RETRIEVER_K = 5
+# How many distinct question embeddings to keep in memory. Repeated questions skip the embedding model.
+EMBEDDING_CACHE_SIZE = 1024
 
 # --- INITIALIZE THE FastAPI APP ---
 app = FastAPI()
@@ -26,13 +34,16 @@ embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
 vectordb = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
 # Initialize the Ollama LLM with the new, faster model
 llm = Ollama(model=MODEL_NAME) 
-retriever = vectordb.as_retriever(search_kwargs={"k": 5})
 template = """
 You are a helpful and knowledgeable assistant for the Thakur College of Engineering and Technology (TCET).
 Your goal is to provide detailed and comprehensive answers based only on the context provided.
 Do not make up information. If the context does not contain the answer, say so clearly.
 
 Based on the following context, please provide a detailed answer to the question.
+Use the conversation so far only to understand what the question refers to.
+
+Conversation so far:
+{history}
 
 Context:
 {context}
@@ -41,35 +52,165 @@ Question:
 {question}
 """
 prompt = ChatPromptTemplate.from_template(template)
-rag_chain = (
-    {"context": retriever, "question": RunnablePassthrough()}
-    | prompt
-    | llm
-    | StrOutputParser()
-)
 print("RAG chain loaded successfully.")
 
+# --- CONVERSATION MEMORY ---
+# Concept: Each WebSocket connection gets its own bounded conversation memory (see `memory.py`),
+# so follow-up questions like "what about its fees?" are understood, while the prompt stays a fixed size.
+conversations = ConversationStore()
+
+
+# --- INSTRUMENTATION ---
+# Concept: Instead of one opaque `rag_chain.astream(...)` call, each stage of the pipeline
+# (embedding, Chroma search, Ollama prefill, generation, socket send) is run and timed separately,
+# so the `/metrics` endpoint can show exactly where a slow answer spends its time.
+@lru_cache(maxsize=EMBEDDING_CACHE_SIZE)
+def embed_question(question):
+    """Embeds a question. Cached, because students ask the same questions over and over."""
+    return tuple(embeddings.embed_query(question))
+
+
+registry = metrics.Registry()
+stage_latency = registry.register(metrics.Histogram(
+    "rag_stage_latency_seconds", "Latency of each stage of the RAG pipeline.", metrics.LATENCY_BUCKETS))
+prompt_tokens = registry.register(metrics.Histogram(
+    "rag_prompt_tokens", "Number of tokens in the prompt sent to the LLM.", metrics.TOKEN_BUCKETS))
+tokens_per_second = registry.register(metrics.Histogram(
+    "rag_generation_tokens_per_second", "LLM generation speed, excluding prefill.", metrics.RATE_BUCKETS))
+generated_tokens = registry.register(metrics.Counter(
+    "rag_generated_tokens_total", "Total number of tokens generated by the LLM."))
+requests_total = registry.register(metrics.Counter(
+    "rag_requests_total", "Number of questions answered, by outcome."))
+active_connections = registry.register(metrics.Gauge(
+    "rag_active_connections", "Number of open WebSocket connections."))
+registry.register(metrics.Gauge(
+    "rag_conversations", "Conversations currently held in memory.",
+    callback=lambda: len(conversations)))
+registry.register(metrics.Gauge(
+    "rag_conversation_memory_tokens", "Estimated tokens held across all conversation memories.",
+    callback=lambda: conversations.tokens))
+registry.register(metrics.Counter(
+    "rag_embedding_cache_hits_total", "Question embeddings served from the cache.",
+    callback=lambda: embed_question.cache_info().hits))
+registry.register(metrics.Counter(
+    "rag_embedding_cache_misses_total", "Question embeddings computed by the model.",
+    callback=lambda: embed_question.cache_info().misses))
+registry.register(metrics.Gauge(
+    "rag_embedding_cache_size", "Question embeddings currently held in the cache.",
+    callback=lambda: embed_question.cache_info().currsize))
+
+
+class OllamaUsageHandler(BaseCallbackHandler):
+    """Reads the token counts Ollama reports in its final streamed chunk."""
+
+    def __init__(self):
+        self.usage = {}
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                self.usage.update(generation.generation_info or {})
+
+
+def format_docs(docs):
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+async def answer_question(websocket, conversation, question):
+    """Runs the RAG pipeline for one question and streams the answer over the WebSocket."""
+    with stage_latency.time(stage="total"):
+        with stage_latency.time(stage="embed"):
+            query_vector = await asyncio.to_thread(embed_question, conversation.retrieval_query(question))
+        with stage_latency.time(stage="retrieve"):
+            docs = await asyncio.to_thread(
+                vectordb.similarity_search_by_vector, list(query_vector), k=RETRIEVER_K)
+        prompt_text = prompt.format(
+            history=conversation.history_text(), context=format_docs(docs), question=question)
+
+        usage_handler = OllamaUsageHandler()
+        answer_chunks = []
+        chunk_count = 0
+        send_time = 0.0
+        llm_start = time.perf_counter()
+        first_chunk_time = None
+        async for chunk in llm.astream(prompt_text, config={"callbacks": [usage_handler]}):
+            if first_chunk_time is None:
+                first_chunk_time = time.perf_counter()
+                # Time to first token is dominated by prompt processing (prefill) inside Ollama.
+                stage_latency.observe(first_chunk_time - llm_start, stage="llm_first_token")
+            chunk_count += 1
+            answer_chunks.append(chunk)
+            send_start = time.perf_counter()
+            await websocket.send_text(chunk)
+            send_time += time.perf_counter() - send_start
+        llm_end = time.perf_counter()
+        # Generation starts at the first chunk, so prefill is only counted in `llm_first_token`.
+        # Every send (including the first chunk's) happens after that point and is counted in `socket_send`.
+        generation_start = first_chunk_time if first_chunk_time is not None else llm_start
+        stage_latency.observe(llm_end - generation_start - send_time, stage="llm_generate")
+
+        send_start = time.perf_counter()
+        await websocket.send_text("<END_OF_STREAM>")
+        send_time += time.perf_counter() - send_start
+        stage_latency.observe(send_time, stage="socket_send")
+    conversation.add_turn(question, "".join(answer_chunks))
+
+    # Ollama reports exact counts. If they are missing, fall back to an estimate:
+    # one streamed chunk per token, and roughly 4 characters per prompt token.
+    usage = usage_handler.usage
+    prompt_tokens.observe(usage.get("prompt_eval_count") or len(prompt_text) // 4)
+    output_tokens = usage.get("eval_count") or chunk_count
+    generated_tokens.inc(output_tokens)
+    if usage.get("eval_duration"):
+        generation_seconds = usage["eval_duration"] / 1e9  # Ollama reports durations in nanoseconds.
+    elif first_chunk_time is not None:
+        generation_seconds = llm_end - first_chunk_time
+    else:
+        generation_seconds = 0
+    if generation_seconds > 0:
+        tokens_per_second.observe(output_tokens / generation_seconds)
+
 
 # --- WEBSOCKET ENDPOINT ---
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """Handles the WebSocket connection for the chatbot."""
     await websocket.accept()
+    active_connections.inc()
+    session_id = uuid.uuid4().hex
     try:
         while True:
             question = await websocket.receive_text()
-            async for chunk in rag_chain.astream(question):
-                await websocket.send_text(chunk)
-            await websocket.send_text("<END_OF_STREAM>")
+            # Looked up on every message: an idle conversation may have been evicted in the meantime.
+            conversation = conversations.get(session_id)
+            try:
+                with metrics.profile_if_slow("ws"):
+                    await answer_question(websocket, conversation, question)
+            except WebSocketDisconnect:
+                requests_total.inc(outcome="disconnected")
+                raise
+            except Exception:
+                requests_total.inc(outcome="error")
+                raise
+            requests_total.inc(outcome="ok")
 
     except WebSocketDisconnect:
         print("Client disconnected")
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
+        active_connections.dec()
+        conversations.drop(session_id)
         await websocket.close()
 
 
+# --- METRICS ENDPOINT ---
+@app.get("/metrics")
+async def read_metrics():
+    """Serves latency histograms, token counts and cache stats in Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 # --- STATIC FILE SERVING ---
 os.makedirs(STATIC_DIR, exist_ok=True)
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
@@ -0,0 +1,151 @@
+import re
+import time
+import threading
+from collections import OrderedDict, deque
+
+# --- CONFIGURATION ---
+# Purpose: Keep the conversation part of the prompt at a fixed size, no matter how long a chat goes on.
+# Token counts are estimated (about 4 characters per token), which is close enough for budgeting.
+CHARS_PER_TOKEN = 4
+WINDOW_TOKEN_BUDGET = 800       # Recent turns, kept word for word.
+SUMMARY_TOKEN_BUDGET = 200      # Older turns, squeezed into a short running summary.
+TURN_CHAR_LIMIT = 1000          # A single question or answer is cut to this length before it is stored.
+REWRITE_TURNS = 2               # How many previous questions are folded into a follow-up retrieval query.
+REWRITE_CHAR_LIMIT = 150        # Each folded-in question is cut to this length, so the follow-up isn't drowned out.
+IDLE_TIMEOUT_SECONDS = 30 * 60  # Conversations untouched for this long are forgotten.
+GLOBAL_TOKEN_CAP = 2_000_000    # Memory cap across all conversations; the least recently used are dropped first.
+
+# Words that refer back to an earlier turn ("what about its fees?").
+# Words like "this" or "there" are left out: "Tell me about this college" and "Is there a hostel?"
+# are complete questions.
+FOLLOW_UP_WORDS = {
+    "it", "its", "it's", "they", "them", "their", "theirs", "these", "those",
+    "he", "she", "his", "her", "same",
+}
+# Openings that only make sense as a follow-up ("and the hostel?", "what about placements?").
+FOLLOW_UP_OPENINGS = ("what about ", "how about ", "and ")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _clip(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+
+def _first_sentence(text):
+    return re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+
+
+# --- CONVERSATION STATE ---
+# Concept: Rolling window + running summary. The newest turns are kept in full. When they no longer
+# fit in `WINDOW_TOKEN_BUDGET`, the oldest turn is squeezed into one short summary line (the question
+# plus the first sentence of the answer), and the summary itself is trimmed from the front to stay
+# within `SUMMARY_TOKEN_BUDGET`. Both parts are bounded, so the prompt is too.
+class Conversation:
+    """The bounded memory of one chat session."""
+
+    def __init__(self, window_budget=WINDOW_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET):
+        self.window_budget = window_budget
+        self.summary_budget = summary_budget
+        self.turns = deque()
+        self.summary_lines = deque()
+        self.window_tokens = 0
+        self.summary_tokens = 0
+
+    @property
+    def tokens(self):
+        return self.window_tokens + self.summary_tokens
+
+    def add_turn(self, question, answer):
+        turn = (_clip(question, TURN_CHAR_LIMIT), _clip(answer, TURN_CHAR_LIMIT))
+        self.turns.append(turn)
+        self.window_tokens += estimate_tokens(turn[0]) + estimate_tokens(turn[1])
+        # Always keep the newest turn, even if it alone is over budget (it is clipped above).
+        while self.window_tokens > self.window_budget and len(self.turns) > 1:
+            self._summarize(self.turns.popleft())
+
+    def _summarize(self, turn):
+        question, answer = turn
+        self.window_tokens -= estimate_tokens(question) + estimate_tokens(answer)
+        line = f"- Asked: {_clip(question, 150)} Answered: {_clip(_first_sentence(answer), 200)}"
+        self.summary_lines.append(line)
+        self.summary_tokens += estimate_tokens(line)
+        while self.summary_tokens > self.summary_budget and self.summary_lines:
+            self.summary_tokens -= estimate_tokens(self.summary_lines.popleft())
+
+    def history_text(self):
+        """The conversation so far, formatted for the prompt."""
+        parts = []
+        if self.summary_lines:
+            parts.append("Summary of earlier conversation:\n" + "\n".join(self.summary_lines))
+        for question, answer in self.turns:
+            parts.append(f"User: {question}\nAssistant: {answer}")
+        return "\n\n".join(parts) if parts else "(no previous conversation)"
+
+    def retrieval_query(self, question):
+        """Turns a follow-up question into a standalone query for the vector database.
+
+        A follow-up like "what about its fees?" is useless on its own, so the last few user questions
+        are put in front of it. Questions that already stand on their own are returned unchanged.
+        """
+        if not self.turns or not self._is_follow_up(question):
+            return question
+        previous = [_clip(q, REWRITE_CHAR_LIMIT) for q, _ in list(self.turns)[-REWRITE_TURNS:]]
+        return " ".join(previous + [question])
+
+    @staticmethod
+    def _is_follow_up(question):
+        text = " ".join(question.lower().split())
+        # All-caps words are acronyms, not pronouns: "IT" is a department, "it" refers back.
+        words = [word.lower() for word in re.findall(r"[A-Za-z']+", question) if not word.isupper()]
+        return text.startswith(FOLLOW_UP_OPENINGS) or any(word in FOLLOW_UP_WORDS for word in words)
+
+
+# --- CONVERSATION STORE ---
+# Concept: LRU eviction. The store is an `OrderedDict` ordered from least to most recently used,
+# so both idle eviction and the global cap always drop conversations from the front of it.
+class ConversationStore:
+    """Holds one `Conversation` per session, with idle eviction and a global memory cap."""
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT_SECONDS, global_token_cap=GLOBAL_TOKEN_CAP):
+        self.idle_timeout = idle_timeout
+        self.global_token_cap = global_token_cap
+        self._conversations = OrderedDict()  # session_id -> (conversation, last_used)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._conversations)
+
+    @property
+    def tokens(self):
+        with self._lock:
+            return sum(conversation.tokens for conversation, _ in self._conversations.values())
+
+    def get(self, session_id):
+        """Returns the session's conversation, starting a new one if it was never seen or was evicted."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            conversation, _ = self._conversations.pop(session_id, (None, None))
+            if conversation is None:
+                conversation = Conversation()
+            self._conversations[session_id] = (conversation, now)
+            return conversation
+
+    def drop(self, session_id):
+        with self._lock:
+            self._conversations.pop(session_id, None)
+
+    def _evict(self, now):
+        while self._conversations:
+            _, (_, last_used) = next(iter(self._conversations.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            self._conversations.popitem(last=False)
+        total = sum(conversation.tokens for conversation, _ in self._conversations.values())
+        while total > self.global_token_cap and self._conversations:
+            _, (conversation, _) = self._conversations.popitem(last=False)
+            total -= conversation.tokens
@@ -0,0 +1,214 @@
+import os
+import sys
+import time
+import threading
+import collections
+from contextlib import contextmanager
+
+# --- CONFIGURATION ---
+# Purpose: Bucket boundaries (in seconds) for the latency histograms.
+# They span from a fast embedding lookup (a few ms) up to a slow LLM answer (a few minutes).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Bucket boundaries for prompt sizes (in tokens).
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+# Bucket boundaries for generation speed (in tokens per second).
+RATE_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160)
+
+# The sampling profiler is opt-in. Enable it with `PROFILE_SLOW_REQUESTS=1`.
+PROFILE_SLOW_REQUESTS = os.environ.get("PROFILE_SLOW_REQUESTS", "0") == "1"
+PROFILE_THRESHOLD_SECONDS = float(os.environ.get("PROFILE_THRESHOLD_SECONDS", "10"))
+PROFILE_INTERVAL_SECONDS = float(os.environ.get("PROFILE_INTERVAL_SECONDS", "0.01"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILER_THREAD_NAME = "slow-request-profiler"
+
+
+# --- METRIC TYPES ---
+# Concept: Prometheus text exposition format. Every metric is rendered as plain text lines
+# (`name{label="value"} number`), which any Prometheus server or a simple `curl` can read.
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Histogram:
+    """A labelled histogram with fixed, cumulative buckets."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1  # The implicit `+Inf` bucket holds every observation.
+            self._series[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes how long the `with` block took, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, (counts, total) in series:
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return lines
+
+
+class Counter:
+    """A monotonically increasing labelled counter, or one read from a callback at render time."""
+
+    def __init__(self, name, help_text, callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        if self.callback:
+            return lines + [f"{self.name} {self.callback()}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    """A single value that can go up and down, or be read from a callback at render time."""
+
+    def __init__(self, name, help_text, callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def render(self):
+        value = self.callback() if self.callback else self._value
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class Registry:
+    """Holds every metric so the `/metrics` endpoint can render them in one go."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# --- SAMPLING PROFILER ---
+# Concept: Statistical profiling. Instead of tracing every function call (which is slow),
+# a background thread takes a snapshot of every thread's call stack at a fixed interval.
+# Functions that show up in many snapshots are where the time is going.
+# The snapshots are written in the "folded" format (`frame;frame;frame count`), which
+# `flamegraph.pl`, speedscope and most other flamegraph tools read directly.
+def _fold_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """Samples all thread stacks while a request runs and dumps them if the request was slow."""
+
+    def __init__(self, label, threshold=PROFILE_THRESHOLD_SECONDS, interval=PROFILE_INTERVAL_SECONDS,
+                 output_dir=PROFILE_DIR):
+        self.label = label
+        self.threshold = threshold
+        self.interval = interval
+        self.output_dir = output_dir
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=PROFILER_THREAD_NAME, daemon=True)
+        self._start = None
+
+    def _run(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                thread_name = names.get(thread_id)
+                if thread_name is None:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    thread_name = names.get(thread_id, str(thread_id))
+                # Skip every profiler thread, not just this one, so concurrent profiles only show real work.
+                if thread_name == PROFILER_THREAD_NAME:
+                    continue
+                self.stacks[f"{thread_name};{_fold_stack(frame)}"] += 1
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops sampling. Returns the path of the dumped profile, or None if the request was fast."""
+        self._stop.set()
+        self._thread.join()
+        elapsed = time.perf_counter() - self._start
+        if elapsed < self.threshold or not self.stacks:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{self.label}_{elapsed:.1f}s.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+@contextmanager
+def profile_if_slow(label):
+    """Runs the `with` block under the sampling profiler when `PROFILE_SLOW_REQUESTS=1`."""
+    if not PROFILE_SLOW_REQUESTS:
+        yield
+        return
+    profiler = SlowRequestProfiler(label).start()
+    try:
+        yield
+    finally:
+        path = profiler.stop()
+        if path:
+            print(f"Slow request profile written to {path}")
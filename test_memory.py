@@ -0,0 +1,65 @@
+import pytest
+
+from memory import Conversation, ConversationStore, REWRITE_CHAR_LIMIT
+
+PREVIOUS_QUESTION = "What are the admission requirements for TCET computer engineering?"
+
+
+@pytest.fixture
+def conversation():
+    conversation = Conversation()
+    conversation.add_turn(PREVIOUS_QUESTION, "You need to pass the entrance exam.")
+    return conversation
+
+
+@pytest.mark.parametrize("question", [
+    "what about its fees?",
+    "What about placements?",
+    "And the hostel?",
+    "How much do they charge?",
+    "Is it accredited?",
+])
+def test_follow_up_questions_include_previous_question(conversation, question):
+    assert conversation.retrieval_query(question) == f"{PREVIOUS_QUESTION} {question}"
+
+
+@pytest.mark.parametrize("question", [
+    "Who is the principal?",
+    "Tell me about this college",
+    "Is there a hostel?",
+    "Are there any scholarships?",
+    "Tell me about the IT branch",
+    "What is the fee for IT?",
+])
+def test_standalone_questions_are_unchanged(conversation, question):
+    assert conversation.retrieval_query(question) == question
+
+
+def test_first_question_is_unchanged():
+    assert Conversation().retrieval_query("what about its fees?") == "what about its fees?"
+
+
+def test_folded_questions_are_clipped():
+    conversation = Conversation()
+    conversation.add_turn("x" * 900, "Answer.")
+    query = conversation.retrieval_query("what are its fees?")
+    assert len(query) <= REWRITE_CHAR_LIMIT + len("... what are its fees?")
+
+
+def test_memory_stays_within_budget():
+    conversation = Conversation()
+    for i in range(200):
+        conversation.add_turn(f"Question {i} " * 20, f"Answer {i}. " + "details " * 200)
+    assert conversation.window_tokens <= conversation.window_budget
+    assert conversation.summary_tokens <= conversation.summary_budget
+
+
+def test_store_evicts_idle_and_over_cap_conversations():
+    store = ConversationStore(idle_timeout=0)
+    store.get("a").add_turn("question", "answer")
+    assert store.get("b") is not None and len(store) == 1
+
+    store = ConversationStore(global_token_cap=1)
+    store.get("a").add_turn("question", "answer")
+    store.get("b")
+    assert len(store) == 1